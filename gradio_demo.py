@@ -11,14 +11,25 @@ Requirements:
 - Set SPEECHALL_API_TOKEN environment variable
 """
 
+import asyncio
+import contextlib
+import functools
+import hashlib
 import os
+import re
+import shutil
+import stat
+import struct
 import tempfile
+import threading
 import time
+import uuid
 from pathlib import Path
 
 import gradio as gr
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from speechall import ApiClient, Configuration
 from speechall.api.speech_to_text_api import SpeechToTextApi
 from speechall.models.transcription_model_identifier import TranscriptionModelIdentifier
@@ -26,28 +37,86 @@ from speechall.models.transcript_language_code import TranscriptLanguageCode
 from speechall.models.transcript_output_format import TranscriptOutputFormat
 from speechall.exceptions import ApiException
 
-# Load environment variables
+# Load environment variables and resolve the API credentials once
 load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+SPEECHALL_API_TOKEN = os.getenv("SPEECHALL_API_TOKEN")
 
+# Speechall enum values for the dropdown choices, built once at import
+MODEL_ENUMS = {
+    model_id: TranscriptionModelIdentifier(model_id)
+    for model_id in ("assemblyai.best", "openai.whisper-1", "deepgram.nova-2")
+}
+LANGUAGE_ENUMS = {
+    language: TranscriptLanguageCode(language)
+    for language in ("en", "es", "fr", "de", "it", "pt", "nl")
+}
+SRT_FORMAT = TranscriptOutputFormat.SRT
 
-def setup_clients():
-    """Set up both OpenAI and Speechall API clients."""
+# TTS settings and on-disk cache of generated audio
+TTS_MODEL = "tts-1"
+TTS_SAMPLE_RATE = 24000  # OpenAI "pcm" output is 24 kHz, 16-bit, mono
+TTS_STREAM_CHUNK_SIZE = 8192
+WAV_UNKNOWN_SIZE = 0xFFFFFFFF  # Header size marker for WAV streams of unknown length
+TTS_MAX_PARALLEL_SENTENCES = 4
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+# Prefer RAM-backed tmpfs so generated audio never has to touch the disk
+TMP_DIR = (
+    "/dev/shm"
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK | os.X_OK)
+    else tempfile.gettempdir()
+)
+# The cache may use at most this much space, and never more than a quarter of
+# the filesystem it lives on (a Docker /dev/shm is only 64 MB by default)
+TTS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+TTS_CACHE_MAX_FS_FRACTION = 4
+# Files handed to a session within this window are never evicted, so the
+# subtitle step can still read the audio the user was just given
+TTS_CACHE_GRACE_SECONDS = 15 * 60
+
+# Upper bounds on concurrent upstream requests across all users
+TTS_MAX_CONCURRENT_REQUESTS = 8
+STT_MAX_CONCURRENT_REQUESTS = 4
+_tts_semaphore = asyncio.Semaphore(TTS_MAX_CONCURRENT_REQUESTS)
+_stt_semaphore = asyncio.Semaphore(STT_MAX_CONCURRENT_REQUESTS)
+
+# In-memory cache of SRT transcripts keyed by audio hash, model and language
+SRT_CACHE_MAX_ENTRIES = 256
+_srt_cache: dict[str, str] = {}
+
+# Requests currently being processed, so identical ones can wait for them
+_tts_inflight: dict[str, asyncio.Future] = {}
+_stt_inflight: dict[str, asyncio.Future] = {}
+
+# Whether the OpenAI connection pool has been primed on Gradio's event loop
+_openai_warmed_up = False
+
+
+@functools.lru_cache(maxsize=1)
+def get_clients():
+    """Set up both OpenAI and Speechall API clients.
+
+    The clients are built once and reused by every request so their HTTP
+    connection pools (and TLS sessions) stay warm between button clicks.
+    """
     # Check for required environment variables
-    openai_key = os.getenv("OPENAI_API_KEY")
-    speechall_token = os.getenv("SPEECHALL_API_TOKEN")
-    
-    if not openai_key:
+    if not OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY environment variable is required")
     
-    if not speechall_token:
+    if not SPEECHALL_API_TOKEN:
         raise ValueError("SPEECHALL_API_TOKEN environment variable is required")
     
-    # Setup OpenAI client
-    openai_client = OpenAI(api_key=openai_key)
+    # Setup OpenAI client on one pooled HTTP/2 connection shared by all handlers
+    http_client = DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+    openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
     
     # Setup Speechall client
     configuration = Configuration()
-    configuration.access_token = speechall_token
+    configuration.access_token = SPEECHALL_API_TOKEN
     configuration.host = "https://api.speechall.com/v1"
     api_client = ApiClient(configuration)
     speechall_client = SpeechToTextApi(api_client)
@@ -55,60 +124,349 @@ def setup_clients():
     return openai_client, speechall_client
 
 
-def text_to_speech(text, voice="alloy"):
-    """Convert text to speech using OpenAI's TTS API."""
+def _warmup_speechall():
+    """Prime the Speechall connection pool with a cheap request."""
+    try:
+        _, speechall_client = get_clients()
+        speechall_client.list_speech_to_text_models()
+    except Exception:
+        # Warmup is best effort; the first real request will reconnect
+        pass
+
+
+async def _warmup_openai():
+    """Prime the OpenAI connection pool with a cheap request (once).
+
+    This has to run on Gradio's event loop rather than in a thread, since the
+    async client's pooled connections are bound to the loop that opened them.
+    """
+    global _openai_warmed_up
+    if _openai_warmed_up:
+        return
+    _openai_warmed_up = True
+    
+    try:
+        openai_client, _ = get_clients()
+        await openai_client.models.list()
+    except Exception:
+        # Warmup is best effort; the first real request will reconnect
+        pass
+
+
+async def _wait_for_inflight(inflight, key):
+    """Wait until no request for key is in flight."""
+    while (pending := inflight.get(key)) is not None:
+        # Shield the shared future so a cancelled waiter doesn't cancel it
+        await asyncio.shield(pending)
+
+
+@contextlib.contextmanager
+def _claim_inflight(inflight, key):
+    """Mark key as in flight, waking any waiting requests when done."""
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    try:
+        yield
+    finally:
+        del inflight[key]
+        future.set_result(None)
+
+
+def _wav_header(data_size=WAV_UNKNOWN_SIZE):
+    """Build a 44-byte WAV header for 16-bit mono PCM at TTS_SAMPLE_RATE."""
+    riff_size = min(36 + data_size, WAV_UNKNOWN_SIZE)
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16, 1, 1, TTS_SAMPLE_RATE, TTS_SAMPLE_RATE * 2, 2, 16,
+        b"data", data_size,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _tts_cache_dir(base_dir=TMP_DIR):
+    """Return a TTS cache directory under base_dir that only this user can access.
+
+    The per-user path is predictable, so another local user could create it
+    first; it is only used if this user owns it and nobody else can access it.
+    Otherwise a fresh private directory is used for this process.
+    """
+    if hasattr(os, "getuid"):
+        cache_dir = Path(base_dir) / f"tts_cache_{os.getuid()}"
+        try:
+            cache_dir.mkdir(mode=0o700, exist_ok=True)
+            dir_stat = os.lstat(cache_dir)
+            if (
+                stat.S_ISDIR(dir_stat.st_mode)
+                and dir_stat.st_uid == os.getuid()
+                and not dir_stat.st_mode & 0o077
+            ):
+                return cache_dir
+        except OSError:
+            pass
+    
+    return Path(tempfile.mkdtemp(prefix="tts_cache_", dir=base_dir))
+
+
+def _tts_cache_dirs():
+    """Return the TTS cache directories in lookup order.
+
+    Audio normally goes to the RAM-backed TMP_DIR; the regular temp dir is
+    only used when that runs out of space.
+    """
+    base_dirs = [TMP_DIR]
+    if TMP_DIR != tempfile.gettempdir():
+        base_dirs.append(tempfile.gettempdir())
+    
+    cache_dirs = []
+    for base_dir in base_dirs:
+        try:
+            cache_dirs.append(_tts_cache_dir(base_dir))
+        except OSError:
+            # Skip a base directory we can't create the cache in
+            pass
+    return cache_dirs
+
+
+def _tts_cache_name(text, voice, model=TTS_MODEL):
+    """Return the content-addressed cache file name for a TTS request."""
+    key = hashlib.sha256(f"{model}|{voice}|{text}".encode()).hexdigest()
+    return f"{key}.wav"
+
+
+def _find_cached_tts(cache_name):
+    """Return the path of a cached TTS file, or None if it isn't cached."""
+    for cache_dir in _tts_cache_dirs():
+        cache_path = cache_dir / cache_name
+        if cache_path.exists():
+            # Mark as recently used for the LRU eviction and the grace window
+            os.utime(cache_path)
+            return cache_path
+    return None
+
+
+def _evict_tts_cache(cache_dir, incoming_bytes=0):
+    """Delete least recently used files until incoming_bytes fit in cache_dir.
+
+    Files handed out within TTS_CACHE_GRACE_SECONDS are kept even if that
+    leaves the cache over its limit.
+    """
+    max_bytes = min(
+        TTS_CACHE_MAX_BYTES,
+        shutil.disk_usage(cache_dir).total // TTS_CACHE_MAX_FS_FRACTION,
+    )
+    
+    files = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".wav"):
+                continue
+            try:
+                files.append((entry.path, entry.stat()))
+            except FileNotFoundError:
+                pass
+    
+    total_bytes = incoming_bytes + sum(file_stat.st_size for _, file_stat in files)
+    grace_cutoff = time.time() - TTS_CACHE_GRACE_SECONDS
+    files.sort(key=lambda item: item[1].st_atime)
+    for path, file_stat in files:
+        if total_bytes <= max_bytes:
+            break
+        if file_stat.st_mtime > grace_cutoff:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= file_stat.st_size
+
+
+def _write_tts_file(cache_path, pcm_data):
+    """Write PCM audio as a WAV file to cache_path, making room for it first."""
+    _evict_tts_cache(cache_path.parent, len(_wav_header()) + len(pcm_data))
+    
+    # Write to a uniquely named temporary file first so readers never see a
+    # partial file and concurrent requests for the same audio don't collide
+    temp_path = cache_path.parent / f"tts_{uuid.uuid4().hex}.wav.tmp"
+    try:
+        with open(temp_path, "wb") as wav_file:
+            wav_file.write(_wav_header(len(pcm_data)))
+            wav_file.write(pcm_data)
+        os.replace(temp_path, cache_path)
+    finally:
+        if temp_path.exists():
+            os.remove(temp_path)
+
+
+def _store_tts_audio(cache_name, pcm_data):
+    """Store PCM audio in the TTS cache and return the path of the WAV file."""
+    cache_dirs = _tts_cache_dirs()
+    if not cache_dirs:
+        raise OSError("No writable directory for the TTS cache")
+    
+    for cache_dir in cache_dirs:
+        cache_path = cache_dir / cache_name
+        try:
+            _write_tts_file(cache_path, pcm_data)
+            return cache_path
+        except OSError:
+            # e.g. a full tmpfs; the audio was already generated, so try the
+            # next directory rather than failing the request
+            if cache_dir == cache_dirs[-1]:
+                raise
+
+
+def _hash_file(path):
+    """Return the SHA-256 hex digest of a file without reading it into memory."""
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+async def _stream_sentence(openai_client, sentence, voice, queue, semaphore):
+    """Stream the PCM chunks of one sentence into queue, ending with None."""
+    try:
+        async with semaphore, _tts_semaphore:
+            async with openai_client.audio.speech.with_streaming_response.create(
+                model=TTS_MODEL,
+                voice=voice,
+                input=sentence,
+                response_format="pcm"
+            ) as response:
+                async for chunk in response.iter_bytes(TTS_STREAM_CHUNK_SIZE):
+                    await queue.put(chunk)
+    finally:
+        await queue.put(None)
+
+
+async def _stream_pcm(openai_client, text, voice):
+    """Yield PCM chunks for text, synthesizing its sentences in parallel.
+
+    Every sentence is requested concurrently (up to TTS_MAX_PARALLEL_SENTENCES
+    at a time), but chunks are yielded in sentence order so playback can start
+    as soon as the first sentence begins to arrive.
+    """
+    sentences = [s for s in SENTENCE_BOUNDARY.split(text.strip()) if s]
+    semaphore = asyncio.Semaphore(TTS_MAX_PARALLEL_SENTENCES)
+    queues = [asyncio.Queue() for _ in sentences]
+    tasks = [
+        asyncio.create_task(_stream_sentence(openai_client, sentence, voice, queue, semaphore))
+        for sentence, queue in zip(sentences, queues)
+    ]
+    
+    try:
+        for queue, task in zip(queues, tasks):
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+            # Re-raise any error from this sentence's request
+            await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Retrieve every outcome so errors from sentences that finished after
+        # a failure aren't reported as "Task exception was never retrieved"
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def text_to_speech(text, voice="alloy"):
+    """Stream speech for the given text from OpenAI's TTS API.
+
+    Yields (audio, status, audio_path) tuples. Audio is yielded as WAV stream
+    bytes while OpenAI is still synthesizing, and the final tuple carries the
+    path of the complete WAV file for transcription.
+    """
     if not text.strip():
-        return None, "Please enter some text to convert to speech."
+        yield None, "Please enter some text to convert to speech.", None
+        return
     
     try:
-        openai_client, _ = setup_clients()
-        
-        # Create a temporary file for the audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-            temp_path = temp_file.name
+        cache_name = _tts_cache_name(text, voice)
         
-        # Generate speech
-        response = openai_client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text
-        )
+        # Let an identical request that is already running fill the cache
+        await _wait_for_inflight(_tts_inflight, cache_name)
+        cache_path = _find_cached_tts(cache_name)
+        if cache_path is not None:
+            yield str(cache_path), f"✅ Audio loaded from cache! ({len(text)} characters)", str(cache_path)
+            return
         
-        # Save to temporary file
-        response.stream_to_file(temp_path)
-        
-        return temp_path, f"✅ Audio generated successfully! ({len(text)} characters)"
+        with _claim_inflight(_tts_inflight, cache_name):
+            openai_client, _ = get_clients()
+            
+            # Generate speech as raw PCM and forward each chunk as it arrives
+            pcm_data = bytearray()
+            start_time = time.perf_counter()
+            first_byte_time = None
+            async for chunk in _stream_pcm(openai_client, text, voice):
+                if first_byte_time is None:
+                    first_byte_time = time.perf_counter() - start_time
+                # Only the first chunk needs a header; the rest is raw PCM
+                audio = chunk if pcm_data else _wav_header() + chunk
+                pcm_data.extend(chunk)
+                yield audio, "🎵 Streaming audio...", None
+            
+            # Never cache a header-only file; later requests would hit it
+            if not pcm_data:
+                raise RuntimeError("OpenAI returned no audio")
+            
+            # File I/O runs in a worker thread to keep the event loop free
+            cache_path = await asyncio.to_thread(_store_tts_audio, cache_name, pcm_data)
+            
+            total_time = time.perf_counter() - start_time
+            status = (
+                f"✅ Audio generated successfully! ({len(text)} characters, "
+                f"first audio after {first_byte_time:.2f}s, done in {total_time:.2f}s)"
+            )
+            # A None audio chunk closes the stream in the player
+            yield None, status, str(cache_path)
         
     except Exception as e:
-        return None, f"❌ Error generating speech: {str(e)}"
+        yield None, f"❌ Error generating speech: {str(e)}", None
 
 
-def speech_to_subtitle(audio_path, model_id="assemblyai.best", language="en"):
+async def speech_to_subtitle(audio_path, model_id="assemblyai.best", language="en"):
     """Convert speech to SRT subtitles using Speechall API."""
     if not audio_path:
         return "", "No audio file available. Please generate speech first."
     
     try:
-        _, speechall_client = setup_clients()
-        
-        # Read audio file
-        with open(audio_path, "rb") as audio_file:
-            audio_data = audio_file.read()
-        
-        # Make transcription request with SRT format
-        result = speechall_client.transcribe(
-            model=TranscriptionModelIdentifier(model_id),
-            body=audio_data,
-            language=TranscriptLanguageCode(language),
-            output_format=TranscriptOutputFormat.SRT,
-            punctuation=True,
-        )
+        # Hash in a worker thread to keep the event loop free
+        audio_hash = await asyncio.to_thread(_hash_file, audio_path)
         
-        # Get the SRT content
-        srt_content = result.text
+        cache_key = f"{audio_hash}|{model_id}|{language}"
         
-        return srt_content, f"✅ Subtitles generated successfully using {model_id}!"
+        # Let an identical request that is already running fill the cache
+        await _wait_for_inflight(_stt_inflight, cache_key)
+        if cache_key in _srt_cache:
+            return _srt_cache[cache_key], f"✅ Subtitles loaded from cache ({model_id})!"
         
+        with _claim_inflight(_stt_inflight, cache_key):
+            _, speechall_client = get_clients()
+            
+            # Make transcription request with SRT format; the Speechall SDK is
+            # synchronous, so run it in a worker thread to keep the event loop free
+            async with _stt_semaphore:
+                result = await asyncio.to_thread(
+                    speechall_client.transcribe,
+                    model=MODEL_ENUMS[model_id],
+                    # A str body is a file path; the SDK still reads the whole
+                    # file into memory, this only skips the read on cache hits
+                    body=audio_path,
+                    language=LANGUAGE_ENUMS[language],
+                    output_format=SRT_FORMAT,
+                    punctuation=True,
+                )
+            
+            # Get the SRT content
+            srt_content = result.text
+            
+            # Drop the oldest entry once the cache is full
+            if len(_srt_cache) >= SRT_CACHE_MAX_ENTRIES:
+                _srt_cache.pop(next(iter(_srt_cache)))
+            _srt_cache[cache_key] = srt_content
+            
+            return srt_content, f"✅ Subtitles generated successfully using {model_id}!"
+        
+    except FileNotFoundError:
+        return "", "⌛ The generated audio has expired. Please generate speech again."
     except ApiException as e:
         return "", f"❌ Speechall API Error: {str(e)}"
     except Exception as e:
@@ -161,24 +519,27 @@ def create_demo():
                 
                 audio_output = gr.Audio(
                     label="Generated Audio",
-                    type="filepath"
+                    type="filepath",
+                    streaming=True,
+                    autoplay=True
                 )
         
         with gr.Row():
             with gr.Column():
                 model_dropdown = gr.Dropdown(
-                    choices=["assemblyai.best", "openai.whisper-1", "deepgram.nova-2"],
+                    choices=list(MODEL_ENUMS),
                     value="assemblyai.best",
                     label="Transcription Model"
                 )
                 
                 language_dropdown = gr.Dropdown(
-                    choices=["en", "es", "fr", "de", "it", "pt", "nl"],
+                    choices=list(LANGUAGE_ENUMS),
                     value="en",
                     label="Language"
                 )
                 
                 stt_button = gr.Button("📝 Generate Subtitles", variant="secondary")
+                pipeline_button = gr.Button("⚡ Generate Speech + Subtitles", variant="primary")
                 stt_status = gr.Textbox(label="STT Status", interactive=False)
                 
                 subtitle_output = gr.Textbox(
@@ -188,13 +549,26 @@ def create_demo():
                 )
         
         # Event handlers
-        def handle_tts(text, voice):
-            audio_path, status = text_to_speech(text, voice)
-            return audio_path, status, audio_path
+        async def handle_tts(text, voice):
+            async for audio, status, audio_path in text_to_speech(text, voice):
+                yield audio, status, audio_path
+        
+        async def handle_stt(audio_path, model, language):
+            # Speechall only offers whole-file transcription, so report progress
+            # right away and replace it with the subtitles once they arrive
+            if audio_path:
+                yield "", f"⏳ Transcribing with {model}..."
+            srt_content, status = await speech_to_subtitle(audio_path, model, language)
+            yield srt_content, status
         
-        def handle_stt(audio_path, model, language):
-            srt_content, status = speech_to_subtitle(audio_path, model, language)
-            return srt_content, status
+        async def handle_pipeline_stt(audio_path, model, language):
+            # There is no separate TTS click to ask for in the one-click flow,
+            # so point at the TTS error instead of transcribing nothing
+            if not audio_path:
+                yield "", "⏭️ Subtitles skipped: speech generation failed (see TTS Status)."
+                return
+            async for srt_content, status in handle_stt(audio_path, model, language):
+                yield srt_content, status
         
         tts_button.click(
             fn=handle_tts,
@@ -207,15 +581,36 @@ def create_demo():
             inputs=[audio_state, model_dropdown, language_dropdown],
             outputs=[subtitle_output, stt_status]
         )
-
+        
+        # One-click pipeline: transcription starts as soon as the audio is
+        # complete, while the player is still working through the stream
+        pipeline_button.click(
+            fn=handle_tts,
+            inputs=[text_input, voice_dropdown],
+            outputs=[audio_output, tts_status, audio_state]
+        ).then(
+            fn=handle_pipeline_stt,
+            inputs=[audio_state, model_dropdown, language_dropdown],
+            outputs=[subtitle_output, stt_status]
+        )
+        
+        # Open the OpenAI connection as soon as the first page loads
+        demo.load(fn=_warmup_openai, api_name=False, show_progress="hidden")
+    
+    # Streaming handlers need the queue; the handlers are async, so let
+    # several sessions be served at once instead of one event at a time
+    demo.queue(concurrency_count=16)
     
     return demo
 
 
 if __name__ == "__main__":
     try:
-        # Verify environment variables are set
-        setup_clients()
+        # Verify environment variables are set and build the shared clients
+        get_clients()
+        
+        # Open the Speechall connection in the background while Gradio starts
+        threading.Thread(target=_warmup_speechall, daemon=True).start()
         
         # Create and launch the demo
         demo = create_demo()